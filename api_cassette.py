@@ -0,0 +1,132 @@
+"""
+Record/replay transport for the Infermedica API calls in medical_diagnosis.
+
+Set INFERMEDICA_CASSETTE_MODE to "record" to save every real API response to
+INFERMEDICA_CASSETTE_DIR (default "cassettes"), or to "replay" to answer the
+same requests from those files without credentials or network access.
+
+While replaying, INFERMEDICA_REPLAY_LATENCY controls how long each call takes:
+    recorded             sample from the latencies seen while recording (default)
+    none                 return immediately
+    fixed:<ms>           always wait <ms> milliseconds
+    lognormal:<ms>:<sd>  log-normal with median <ms> and shape <sd>
+Samples come from a RNG seeded with INFERMEDICA_REPLAY_SEED, so replays are repeatable.
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+import user_storage
+
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode when a request was never recorded."""
+
+
+class RecordedResponse:
+    """The parts of a requests.Response that medical_diagnosis uses."""
+
+    def __init__(self, entry):
+        self.status_code = entry["status_code"]
+        self.text = entry["body"]
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class Cassette:
+    def __init__(self, directory, mode, latency="recorded", seed=0, responder=None):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+
+        self.directory = directory
+        self.mode = mode
+        self.latency = latency.split(":")
+        self.seed = seed
+        # Records answers from responder(method, endpoint, params, body) -> (response, latency)
+        # instead of the live API, e.g. synthetic_api.respond
+        self.responder = responder
+        self._call_counts = {}
+        self._lock = threading.Lock()
+
+    def request(self, method, endpoint, send, params=None, json=None):
+        """
+        Record or replay one API call. send() performs the real request and is
+        only called in record mode.
+        """
+        key = self._key(method, endpoint, params, json)
+        path = os.path.join(self.directory, f"{endpoint}_{key}.json")
+
+        if self.mode == "replay":
+            entry = user_storage.read_json(path)
+            if entry is None:
+                raise CassetteMiss(f"No recorded response for {method} {endpoint} {params or json}")
+            time.sleep(self._replay_delay(key, entry))
+            return RecordedResponse(entry)
+
+        if self.responder is not None:
+            response, elapsed = self.responder(method, endpoint, params, json)
+        else:
+            start = time.perf_counter()
+            response = send()
+            elapsed = time.perf_counter() - start
+
+        def record(entry):
+            latencies = (entry or {}).get("latencies", [])
+            return {
+                "method": method,
+                "endpoint": endpoint,
+                "params": params,
+                "json": json,
+                "status_code": response.status_code,
+                "body": response.text,
+                "latencies": latencies + [elapsed]
+            }
+
+        user_storage.update_json(path, record)
+        return response
+
+    def _key(self, method, endpoint, params, body):
+        # Credentials and the base URL are left out so cassettes work with any account
+        request = json.dumps([method.upper(), endpoint, params, body], sort_keys=True)
+        return hashlib.sha256(request.encode()).hexdigest()[:16]
+
+    def _replay_delay(self, key, entry):
+        """Seconds to wait before returning a replayed response"""
+        with self._lock:
+            count = self._call_counts.get(key, 0)
+            self._call_counts[key] = count + 1
+        rng = random.Random(f"{self.seed}:{key}:{count}")
+
+        kind = self.latency[0]
+        if kind == "none":
+            return 0
+        if kind == "recorded":
+            latencies = entry.get("latencies") or [0]
+            return rng.choice(latencies)
+        if kind == "fixed":
+            return float(self.latency[1]) / 1000
+        if kind == "lognormal":
+            median_ms, sigma = float(self.latency[1]), float(self.latency[2])
+            return rng.lognormvariate(0, sigma) * median_ms / 1000
+        raise ValueError(f"Unknown replay latency: {':'.join(self.latency)}")
+
+
+def from_env():
+    """
+    Build a Cassette from the INFERMEDICA_* environment variables,
+    or return None when record/replay isn't turned on.
+    """
+    mode = os.getenv("INFERMEDICA_CASSETTE_MODE")
+    if not mode:
+        return None
+
+    return Cassette(
+        os.getenv("INFERMEDICA_CASSETTE_DIR", "cassettes"),
+        mode,
+        latency=os.getenv("INFERMEDICA_REPLAY_LATENCY", "recorded"),
+        seed=int(os.getenv("INFERMEDICA_REPLAY_SEED", "0"))
+    )
@@ -1,14 +1,25 @@
 # app.py - Main Flask application
 from flask import Flask, render_template, request, jsonify, session
 import os
+import json
 import secrets
 from datetime import datetime
 
+# WebSocket chat is optional; without flask-sock the client just keeps using /api/chat
+try:
+    from flask_sock import Sock
+    from simple_websocket import ConnectionClosed
+except ImportError:
+    Sock = None
+
 # Import the MedicalChatbot class
 from medical_chatbot import MedicalChatbot
+from speculation import speculation_stats
+from chat_connection import ChatConnection
 
 app = Flask(__name__, static_folder='static', template_folder='templates')
 app.secret_key = secrets.token_hex(16)
+sock = Sock(app) if Sock is not None else None
 
 # In-memory storage for chatbot instances
 chatbot_instances = {}
@@ -39,9 +50,56 @@ def chat():
     
     return jsonify({
         'message': response,
+        'data': chatbot.last_response_data,
         'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     })
 
+if sock is not None:
+    @sock.route('/ws/chat')
+    def chat_socket(ws):
+        """Process chat messages over a persistent WebSocket, and push background results"""
+        session_id = session.get('session_id')
+
+        if not session_id or session_id not in chatbot_instances:
+            ws.send(json.dumps({'error': 'Invalid session'}))
+            return
+
+        chatbot = chatbot_instances[session_id]
+        connection = ChatConnection(ws)
+        chatbot.push = connection.push
+        try:
+            # One message at a time: the next one isn't read until this reply is queued
+            while not connection.closed:
+                raw = ws.receive()
+                # A bad message gets an error reply; the connection stays open for the next one
+                try:
+                    message = json.loads(raw).get('message', '')
+                except (ValueError, AttributeError):
+                    connection.send({'type': 'reply', 'error': 'Invalid message',
+                                     'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+                    continue
+
+                try:
+                    response = chatbot.process_message(message)
+                except Exception as e:
+                    print(f"Error processing WebSocket message: {e}")
+                    connection.send({'type': 'reply', 'error': 'Error processing message',
+                                     'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+                    continue
+
+                connection.send({
+                    'type': 'reply',
+                    'message': response,
+                    'data': chatbot.last_response_data,
+                    'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                })
+        except ConnectionClosed:
+            pass
+        finally:
+            if chatbot.push == connection.push:
+                chatbot.push = None
+            connection.close(flush=True)
+
 @app.route('/api/history', methods=['GET'])
 def get_history():
     """Get the chat history for the current session"""
@@ -69,5 +127,12 @@ def check_files():
         'index_exists': index_exists
     })
 
+@app.route('/api/metrics')
+def metrics():
+    """Debug route with the speculative diagnosis hit rate and wasted API calls"""
+    return jsonify({
+        'speculation': speculation_stats()
+    })
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
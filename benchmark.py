@@ -0,0 +1,430 @@
+"""
+Benchmarks for the chatbot, run against recorded Infermedica responses.
+
+Record the API responses once with real credentials (each run adds to the
+recorded latency distribution):
+    INFERMEDICA_CASSETTE_MODE=record APP_ID=... APP_KEY=... API_URL=... python benchmark.py conversation
+Then replay them anywhere, without credentials or network access:
+    python benchmark.py conversation
+    INFERMEDICA_REPLAY_LATENCY=none python benchmark.py conversation --runs 50
+
+Without a cassette directory, synthetic cassettes are generated first from
+synthetic_api (seeded, so every checkout gets the same ones), which is how the
+published numbers were produced:
+    INFERMEDICA_REPLAY_LATENCY=lognormal:250:0.5 python benchmark.py conversation done interview
+
+"stress" checks that concurrent sessions of one user never lose or duplicate
+saved data, and exits with an error if they do:
+    python benchmark.py stress --processes 16 --runs 100
+
+"archive" writes two files per user, so it only runs when named:
+    python benchmark.py archive --users 100000
+"""
+import argparse
+import collections
+import contextlib
+import copy
+import io
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# Replay by default so a benchmark never hits the live API by accident
+os.environ.setdefault("INFERMEDICA_CASSETTE_MODE", "replay")
+os.environ["INFERMEDICA_CASSETTE_DIR"] = os.path.abspath(os.getenv("INFERMEDICA_CASSETTE_DIR", "cassettes"))
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import api_cassette
+import chatbot_responses
+import medical_chatbot
+import medical_diagnosis as md
+import synthetic_api
+from medical_chatbot import MedicalChatbot
+from speculation import speculation_stats
+
+# A symptom check from greeting to diagnosis, then every follow-up question is
+# answered with INTERVIEW_ANSWER and the result isn't saved
+CONVERSATION = ["hi", "benchmark user", "2", "35", "male", "fever, cough and headache", "1,2,3", "done"]
+INTERVIEW_ANSWER = "1"
+
+# Symptoms added one at a time before "done", and how long the user takes to type each reply
+SYMPTOM_TURNS = ["fever", "1", "cough", "1"]
+THINK_TIME = 0.5
+
+
+@contextlib.contextmanager
+def patched(module, **values):
+    """Set module globals for the duration of a benchmark, restoring the previous values afterwards"""
+    saved = {name: getattr(module, name) for name in values}
+    for name, value in values.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(module, name, value)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def report(title, timings):
+    """Print median/p95/max in milliseconds for each named timing list"""
+    print(title)
+    for name, values in timings.items():
+        print(f"  {name:<30} median {statistics.median(values) * 1000:8.2f} ms"
+              f"   p95 {percentile(values, 95) * 1000:8.2f} ms   max {max(values) * 1000:8.2f} ms")
+
+
+def report_speculation(before):
+    """Print the speculation counters accumulated since the `before` snapshot"""
+    stats = {name: value - before[name] for name, value in speculation_stats().items() if name != "hit_rate"}
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else None
+    print(f"  speculation: {stats}")
+
+
+def run_conversation(chatbot, messages):
+    """Send each message and return how long every turn took"""
+    timings = []
+    for message in messages:
+        start = time.perf_counter()
+        chatbot.process_message(message)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def run_interview(chatbot, think_time=0):
+    """Answer follow-up questions until the results are shown; returns how long each answer took"""
+    timings = []
+    while chatbot.conversation_state == "interview":
+        time.sleep(think_time)
+        timings.extend(run_conversation(chatbot, [INTERVIEW_ANSWER]))
+    return timings
+
+
+def bench_conversation(args):
+    """Per-turn latency of a whole symptom check, follow-up questions included"""
+    runs = args.runs
+    turns = {f"{i + 1}. {message}": [] for i, message in enumerate(CONVERSATION)}
+    turns["follow-up answers"] = []
+    turns["no (don't save)"] = []
+    totals = []
+    for _ in range(runs):
+        chatbot = MedicalChatbot()
+        timings = run_conversation(chatbot, CONVERSATION)
+        for name, elapsed in zip(turns, timings):
+            turns[name].append(elapsed)
+        answers = run_interview(chatbot)
+        turns["follow-up answers"].extend(answers)
+        timings += answers + run_conversation(chatbot, ["no"])
+        turns["no (don't save)"].append(timings[-1])
+        totals.append(sum(timings))
+
+    turns["total"] = totals
+    report(f"Symptom check conversation ({runs} runs)", turns)
+
+
+def bench_done_latency(args):
+    """
+    Perceived latency of the "done" turn, with and without speculative diagnosis, both
+    when follow-up questions come next and when the results are shown straight away
+    """
+    runs = args.runs
+    before = speculation_stats()
+    timings = {}
+    for max_questions in (medical_chatbot.INTERVIEW_MAX_QUESTIONS, 0):
+        for enabled in (False, True):
+            shows = "question" if max_questions else "results"
+            name = f"{shows} next ({'speculative' if enabled else 'no speculation'})"
+            timings[name] = []
+            with patched(medical_chatbot, SPECULATIVE_DIAGNOSIS=enabled, INTERVIEW_MAX_QUESTIONS=max_questions):
+                for _ in range(runs):
+                    chatbot = MedicalChatbot()
+                    run_conversation(chatbot, CONVERSATION[:5] + SYMPTOM_TURNS)
+                    time.sleep(THINK_TIME)
+                    timings[name].append(run_conversation(chatbot, ["done"])[0])
+                    run_interview(chatbot)
+                    run_conversation(chatbot, ["no"])
+
+    report(f"Perceived \"done\" latency, {THINK_TIME:.1f}s think time ({runs} runs)", timings)
+    report_speculation(before)
+
+
+def bench_interview(args):
+    """Latency of answering follow-up questions, with and without prefetching"""
+    runs = args.runs
+    timings = {}
+    for prefetch in (False, True):
+        suffix = "(prefetched)" if prefetch else "(no prefetch)"
+        answers = timings[f"answer {suffix}"] = []
+        last_answers = timings[f"last answer {suffix}"] = []
+        with patched(medical_chatbot, INTERVIEW_PREFETCH=prefetch):
+            for _ in range(runs):
+                chatbot = MedicalChatbot()
+                run_conversation(chatbot, CONVERSATION[:5] + SYMPTOM_TURNS + ["done"])
+                elapsed = run_interview(chatbot, THINK_TIME)
+                # The last answer shows the results, so it also needs triage
+                answers.extend(elapsed[:-1])
+                last_answers.extend(elapsed[-1:])
+                run_conversation(chatbot, ["no"])
+
+    report(f"Follow-up question answers, {THINK_TIME:.1f}s think time ({runs} runs)", timings)
+
+
+def _render_symptom_results_concat(groups):
+    """The symptom result rendering from before chatbot_responses, kept as the baseline"""
+    response = "I found these matching symptoms. Please select one or more by number (e.g. 1,3):\n"
+    number = 0
+    for phrase, symptoms in groups:
+        if len(groups) > 1:
+            response += f"\nFor '{phrase}':\n"
+        for symptom in symptoms:
+            number += 1
+            response += f"{number}. {symptom['name']} (Common Name: {symptom['common_name']})\n"
+    response += "\nOr type 'none' if none of these match your symptoms."
+    return response
+
+
+def bench_render(args):
+    """Rendering a large symptom result list: old += loop vs chatbot_responses"""
+    symptoms = [{"id": f"s_{i}", "name": f"Symptom {i}", "common_name": f"Common symptom {i}"} for i in range(4000)]
+    groups = [(f"phrase {j}", symptoms[j * 1000:(j + 1) * 1000]) for j in range(4)]
+
+    timings = {"+= concatenation": [], "render_symptom_results": []}
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        _render_symptom_results_concat(groups)
+        timings["+= concatenation"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        chatbot_responses.render_symptom_results(groups)
+        timings["render_symptom_results"].append(time.perf_counter() - start)
+
+    report(f"Rendering {len(symptoms)} symptom results in {len(groups)} groups ({args.runs} runs)", timings)
+
+
+def bench_transport(args):
+    """Messages/sec and per-message latency over POST /api/chat vs the /ws/chat WebSocket"""
+    runs = args.runs
+    import threading
+    import requests
+    import simple_websocket
+    from werkzeug.serving import make_server
+    from app import app
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"127.0.0.1:{server.server_port}"
+
+    # Log in, then send main-menu messages that don't call the Infermedica API
+    def messages(username):
+        return ["hi", username] + ["hello"] * (runs * 10)
+
+    timings = {"POST /api/chat": [], "WebSocket /ws/chat": []}
+
+    http = requests.Session()
+    http.get(f"http://{base_url}/")
+    for message in messages("post benchmark"):
+        start = time.perf_counter()
+        http.post(f"http://{base_url}/api/chat", json={"message": message}).json()
+        timings["POST /api/chat"].append(time.perf_counter() - start)
+
+    http = requests.Session()
+    http.get(f"http://{base_url}/")
+    cookie = "; ".join(f"{name}={value}" for name, value in http.cookies.items())
+    ws = simple_websocket.Client.connect(f"ws://{base_url}/ws/chat", headers={"Cookie": cookie})
+    for message in messages("websocket benchmark"):
+        start = time.perf_counter()
+        ws.send(json.dumps({"message": message}))
+        # Skip any pushed events until the reply arrives
+        while json.loads(ws.receive()).get("type") != "reply":
+            pass
+        timings["WebSocket /ws/chat"].append(time.perf_counter() - start)
+    ws.close()
+    server.shutdown()
+
+    report(f"Chat transport ({len(timings['POST /api/chat'])} messages each)", timings)
+    for name, values in timings.items():
+        print(f"  {name:<30} {len(values) / sum(values):8.1f} messages/sec")
+
+
+def bench_archive(args):
+    """Bulk export and import of every user's files with history_archive"""
+    import resource
+    import history_archive
+    import user_storage
+
+    # Typical users: a short medical history and a ten-message chat log
+    for directory in history_archive.SOURCES.values():
+        os.makedirs(directory, exist_ok=True)
+    for i in range(args.users):
+        username = f"user_{i}"
+        user_storage.atomic_write_json(f"user_medical_histories/{username}_medical_history.json", {
+            "username": username, "chronic_conditions": ["asthma"], "allergies": ["penicillin"],
+            "medications": [], "previous_surgeries": [], "previous_predictions": [], "_version": 1
+        })
+        user_storage.atomic_write_json(f"chat_histories/{username}_chat_history.json", [
+            {"role": "user" if n % 2 else "bot", "message": f"message {n}", "timestamp": "2025-01-01 12:00:00"}
+            for n in range(10)
+        ])
+
+    archive_path = os.path.abspath("histories.jsonl.gz")
+    start = time.perf_counter()
+    exported = history_archive.export_histories(archive_path)
+    export_time = time.perf_counter() - start
+
+    # Import into an empty tree, then go back so later benchmarks use the usual scratch directory
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="chatbot_benchmark_import_") as import_dir:
+        os.chdir(import_dir)
+        try:
+            start = time.perf_counter()
+            imported = history_archive.import_histories(archive_path)
+            import_time = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+
+    print(f"History archive ({args.users} users, {exported} files)")
+    print(f"  export                         {export_time:8.2f} s   {exported / export_time:10.0f} files/sec")
+    print(f"  import                         {import_time:8.2f} s   {imported / import_time:10.0f} files/sec")
+    print(f"  archive size                   {os.path.getsize(archive_path) / 1e6:8.2f} MB")
+    print(f"  peak RSS                       {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:8.1f} MB")
+
+
+STRESS_USER = "stress user"
+
+
+def _stress_worker(worker, saves):
+    """One session of the shared user: add an allergy and a chat message, save both, repeat"""
+    import medical_diagnosis as md
+
+    chatbot = MedicalChatbot()
+    chatbot.current_user = STRESS_USER
+    failures = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        history = md.load_medical_history(STRESS_USER) or {"username": STRESS_USER, "allergies": []}
+        base = copy.deepcopy(history)
+        for i in range(saves):
+            history["allergies"].append(f"allergy {worker}-{i}")
+            saved = md.save_medical_history(history, STRESS_USER, base=base)
+            if saved is None:
+                failures += 1
+            else:
+                history, base = saved, copy.deepcopy(saved)
+
+            chatbot.conversation_history.append({"role": "user", "message": f"message {worker}-{i}"})
+            if not chatbot.save_chat_history():
+                failures += 1
+    return failures
+
+
+def bench_stress(args):
+    """
+    Several processes saving medical history and chat messages for the same user at once.
+    Fails unless every allergy and every message ends up on disk exactly once.
+    """
+    import medical_diagnosis as md
+    import user_storage
+
+    saves = args.runs
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.processes) as pool:
+        failures = sum(pool.starmap(_stress_worker, [(worker, saves) for worker in range(args.processes)]))
+    elapsed = time.perf_counter() - start
+
+    expected = collections.Counter(f"{worker}-{i}" for worker in range(args.processes) for i in range(saves))
+    with contextlib.redirect_stdout(io.StringIO()):
+        history = md.load_medical_history(STRESS_USER) or {}
+    chat = user_storage.read_json(f"chat_histories/{STRESS_USER.replace(' ', '_')}_chat_history.json", [])
+    allergies = collections.Counter(item[len("allergy "):] for item in history.get("allergies", []))
+    messages = collections.Counter(item["message"][len("message "):] for item in chat)
+
+    print(f"Concurrent saves for one user ({args.processes} processes x {saves} saves)")
+    print(f"  {'saves/sec':<30} {2 * sum(expected.values()) / elapsed:8.1f}")
+    problems = []
+    for name, found in (("allergies", allergies), ("chat messages", messages)):
+        lost = sum((expected - found).values())
+        duplicated = sum((found - expected).values())
+        print(f"  {name:<30} {sum(found.values()):8d} on disk, {lost} lost, {duplicated} duplicated")
+        if lost or duplicated:
+            problems.append(name)
+    if failures:
+        problems.append(f"{failures} failed saves")
+    if problems:
+        sys.exit(f"Concurrent save check failed: {', '.join(problems)}")
+
+
+BENCHMARKS = {
+    "conversation": bench_conversation,
+    "done": bench_done_latency,
+    "interview": bench_interview,
+    "transport": bench_transport,
+    "render": bench_render,
+    "archive": bench_archive,
+    "stress": bench_stress,
+}
+
+
+# Slow and disk-heavy, so only run when asked for by name
+OPT_IN_BENCHMARKS = ["archive"]
+
+# The benchmarks that call the Infermedica API, and so need cassettes
+API_BENCHMARKS = ["conversation", "done", "interview"]
+
+
+def generate_cassettes(directory):
+    """Record one run of every API benchmark against synthetic_api into directory"""
+    print(f"Generating synthetic cassettes in {directory}")
+    replay = md.CASSETTE
+    md.CASSETTE = api_cassette.Cassette(directory, "record", responder=synthetic_api.respond)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for name in API_BENCHMARKS:
+                BENCHMARKS[name](argparse.Namespace(runs=1))
+    finally:
+        md.CASSETTE = replay
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run chatbot benchmarks against recorded API responses")
+    parser.add_argument("benchmarks", nargs="*",
+                        help=f"benchmarks to run: {', '.join(BENCHMARKS)} (default: all but {', '.join(OPT_IN_BENCHMARKS)})")
+    parser.add_argument("--runs", type=int, default=20, help="how many times to repeat each benchmark")
+    parser.add_argument("--users", type=int, default=10000, help="number of users for the archive benchmark")
+    parser.add_argument("--processes", type=int, default=8, help="number of processes for the stress benchmark")
+    parser.add_argument("--generate-cassettes", action="store_true",
+                        help="record synthetic API responses for any requests missing from the cassettes")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+
+    names = args.benchmarks or [name for name in BENCHMARKS if name not in OPT_IN_BENCHMARKS]
+    cassettes = os.environ["INFERMEDICA_CASSETTE_DIR"]
+    replaying = md.CASSETTE is not None and md.CASSETTE.mode == "replay"
+
+    # Chat and medical history files are written to a scratch directory, not the real ones,
+    # and the directory is removed afterwards
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="chatbot_benchmark_") as scratch:
+        os.chdir(scratch)
+        try:
+            if replaying and set(names) & set(API_BENCHMARKS) and (args.generate_cassettes or not os.path.isdir(cassettes)):
+                generate_cassettes(cassettes)
+
+            for name in names:
+                BENCHMARKS[name](args)
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Outgoing side of a chat WebSocket.
+
+All sends go through one writer thread fed by a bounded queue. That way replies
+and server-pushed messages never interleave on the socket, and a client that
+stops reading can't make the server buffer messages without limit.
+"""
+import json
+import queue
+import threading
+
+
+class ChatConnection:
+    def __init__(self, ws, max_queue=32, send_timeout=10):
+        self.ws = ws
+        self.send_timeout = send_timeout
+        self.closed = False
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def send(self, payload):
+        """
+        Queue a reply, waiting while the queue is full.
+        Returns False (and closes the connection) if the client stopped reading.
+        """
+        if self.closed:
+            return False
+        try:
+            self._queue.put(json.dumps(payload), timeout=self.send_timeout)
+            return True
+        except queue.Full:
+            self.close()
+            return False
+
+    def push(self, payload):
+        """
+        Queue a message the client didn't ask for. These are only hints,
+        so they are dropped rather than waited on when the client is behind.
+        """
+        if self.closed:
+            return False
+        try:
+            self._queue.put_nowait(json.dumps(payload))
+            return True
+        except queue.Full:
+            return False
+
+    def close(self, flush=False):
+        """Stop accepting messages; with flush, wait for the queued ones to be written"""
+        self.closed = True
+        try:
+            # Wakes the writer up once everything queued before it has been sent
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        if flush:
+            self._writer.join(timeout=self.send_timeout)
+
+    def _write_loop(self):
+        while True:
+            try:
+                message = self._queue.get(timeout=1)
+            except queue.Empty:
+                if self.closed:
+                    return
+                continue
+            if message is None:
+                return
+
+            try:
+                self.ws.send(message)
+            except Exception:
+                self.closed = True
+                return
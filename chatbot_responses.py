@@ -0,0 +1,156 @@
+"""
+Response rendering for MedicalChatbot.
+
+Static prompts are built once at import time, and the dynamic lists (symptom
+results, conditions, previous diagnoses) are assembled with a single join.
+Every list builder returns (text, data): the text goes into the chat history
+as before, and the data is a plain dict the web client can render directly.
+"""
+
+MAIN_MENU = "1️⃣ Manage Medical History\n2️⃣ Symptom Diagnosis\n3️⃣ View Previous Diagnoses"
+POST_DIAGNOSIS_MENU = "1️⃣ Manage Medical History\n2️⃣ Start Another Symptom Check\n3️⃣ View Previous Diagnoses"
+MEDICAL_HISTORY_MENU = "1️⃣ Chronic Conditions\n2️⃣ Allergies\n3️⃣ Medications\n4️⃣ Previous Surgeries\n5️⃣ Return to Main Menu"
+
+GREETING_PROMPT = "👋 Welcome to the AI Health Assistant! I can help you manage your medical history and analyze your symptoms. What's your username?"
+MAIN_MENU_INVALID = "I didn't understand your selection. Please choose one of the following:\n" + MAIN_MENU
+MEDICAL_HISTORY_PROMPT = "Let's manage your medical history. What would you like to update?\n" + MEDICAL_HISTORY_MENU
+MEDICAL_HISTORY_SAVED = "Medical history updated and saved. What would you like to do next?\n" + MAIN_MENU
+MEDICAL_HISTORY_SAVE_FAILED = "Sorry, I couldn't save your medical history. Please try again later. What would you like to do next?\n" + MAIN_MENU
+SELECT_CATEGORY_PROMPT = "Please select a category to update first:\n" + MEDICAL_HISTORY_MENU
+SYMPTOM_CHECK_CANCELLED = "Symptom check cancelled. What would you like to do?\n" + MAIN_MENU
+DIAGNOSIS_SAVED = "I've saved your diagnosis to your medical history. What would you like to do next?\n" + POST_DIAGNOSIS_MENU
+DIAGNOSIS_SAVE_FAILED = "Sorry, I couldn't save your diagnosis. Please try again later. What would you like to do next?\n" + POST_DIAGNOSIS_MENU
+DIAGNOSIS_NOT_SAVED = "I haven't saved this diagnosis. What would you like to do next?\n" + POST_DIAGNOSIS_MENU
+ASK_SYMPTOMS_PROMPT = "Now, please tell me what symptoms you're experiencing. You can enter several at once, e.g. 'fever, cough and headache'."
+NO_PREVIOUS_DIAGNOSES = "You don't have any previous diagnoses saved. Would you like to start a new symptom check?\n1️⃣ Yes, start new symptom check\n2️⃣ No, return to main menu"
+
+TRIAGE_RECOMMENDATIONS = {
+    "self_care": "Your symptoms suggest you can manage this with self-care. Monitor your condition and rest.",
+    "consultation": "Consider scheduling a consultation with a healthcare provider.",
+    "emergency": "Seek immediate medical attention. Your symptoms may indicate a serious condition."
+}
+DEFAULT_RECOMMENDATION = "Consult with a healthcare professional for guidance."
+
+
+def render_sections(kind, title, sections, footer=""):
+    """
+    Render a titled list made of (heading, items, style) sections, where style is
+    "numbered" (numbers run on across sections), "bulleted" or "plain".
+    Returns the chat text and the matching structured data; the data keeps the
+    items without their number/bullet so the client can use a real list.
+    """
+    parts = [title]
+    data_sections = []
+    number = 0
+    for heading, items, style in sections:
+        if heading:
+            parts.append("")
+            parts.append(heading)
+
+        if style == "numbered":
+            parts.extend(f"{number + i}. {item}" for i, item in enumerate(items, 1))
+        elif style == "bulleted":
+            parts.extend(f"- {item}" for item in items)
+        else:
+            parts.extend(items)
+
+        data_sections.append({"heading": heading, "items": items, "style": style, "start": number + 1})
+        if style == "numbered":
+            number += len(items)
+
+    if footer:
+        parts.append("")
+        parts.append(footer)
+
+    data = {
+        "type": kind,
+        "title": title,
+        "sections": data_sections,
+        "footer": footer
+    }
+    return "\n".join(parts), data
+
+
+def render_symptom_results(groups, not_found=None, has_more=False):
+    """
+    Render one page of symptom search results grouped by the phrase that found them.
+    groups is a list of (phrase, symptoms); numbering runs across all groups.
+    """
+    sections = []
+    for phrase, symptoms in groups:
+        items = [f"{symptom['name']} (Common Name: {symptom['common_name']})" for symptom in symptoms]
+        heading = f"For '{phrase}':" if phrase and len(groups) > 1 else None
+        sections.append((heading, items, "numbered"))
+
+    footer = "Or type 'none' if none of these match your symptoms."
+    if has_more:
+        footer = "Type 'more' to see more matches. " + footer
+    if not_found:
+        footer = "I couldn't find anything for: " + ", ".join(f"'{phrase}'" for phrase in not_found) + "\n" + footer
+
+    return render_sections(
+        "symptom_results",
+        "I found these matching symptoms. Please select one or more by number (e.g. 1,3):",
+        sections,
+        footer
+    )
+
+
+def render_diagnosis(conditions, triage_info):
+    """
+    Render the diagnosis result block from the saved conditions and triage info.
+    """
+    sections = []
+    if conditions:
+        items = [f"{condition['name']} (Probability: {condition['probability']:.1f}%)" for condition in conditions]
+        sections.append(("🩺 Possible Conditions:", items, "bulleted"))
+
+    if triage_info:
+        items = [triage_info["recommendation"]]
+        if triage_info.get("teleconsultation_applicable"):
+            items.append("💻 A telehealth consultation may be appropriate for your condition.")
+        sections.append(("🚑 Recommended Next Steps:", items, "plain"))
+
+    return render_sections(
+        "diagnosis",
+        "Based on your symptoms, here's what I found:",
+        sections,
+        "Would you like me to save this diagnosis to your medical history? (yes/no)"
+    )
+
+
+def render_previous_diagnoses(diagnoses):
+    """
+    Render a list of saved predictions, most recent last.
+    """
+    sections = []
+    for i, diagnosis in enumerate(diagnoses, 1):
+        date = diagnosis.get('date', 'Unknown date')
+        symptoms = ", ".join(diagnosis.get('symptoms', []))
+        conditions = ", ".join(f"{c['name']} ({c['probability']:.1f}%)" for c in diagnosis.get('conditions', [])[:2])
+        sections.append((f"Diagnosis {i} ({date}):", [f"Symptoms: {symptoms}", f"Top conditions: {conditions}"], "plain"))
+
+    return render_sections(
+        "previous_diagnoses",
+        "Here are your most recent diagnoses:",
+        sections,
+        "What would you like to do next?\n1️⃣ Start new symptom check\n2️⃣ Return to main menu"
+    )
+
+
+def render_question(question, options):
+    """
+    Render a follow-up question from the diagnosis.
+    options is the list of (label, evidence) answers, or None when several items can apply.
+    """
+    if options is None:
+        items = [item['name'] for item in question.get('items', [])]
+        footer = "Reply with the numbers of all that apply (e.g. 1,3), or 'none'. Type 'stop' to see your results now."
+    elif question.get('type') == "group_single":
+        items = [label for label, _ in options]
+        footer = "Reply with a number, or 'none'. Type 'stop' to see your results now."
+    else:
+        items = [label for label, _ in options]
+        footer = "Reply with a number, or type 'stop' to see your results now."
+
+    return render_sections("question", question['text'], [(None, items, "numbered")], footer)
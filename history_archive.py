@@ -0,0 +1,208 @@
+"""
+Bulk export/import of every user's medical history and chat log.
+
+    python history_archive.py export backup.jsonl.gz
+    python history_archive.py import backup.jsonl.gz
+    python history_archive.py export backup.jsonl.gz --resume   # carry on after an interruption
+
+The archive is gzip-compressed JSON Lines with one record per file:
+    {"kind": "medical_history", "file": "...", "sha256": "...", "content": "<file text>"}
+followed by an {"kind": "end", "records": N} trailer. File contents are copied
+byte for byte, not parsed, and files are read and written by a worker pool with
+a bounded number in flight, so file contents never pile up in memory. The one
+thing that grows with the number of users is the sorted list of file names an
+export works from (roughly 100 bytes per file, about 20 MB for 100k users).
+
+Imports are meant for a server that isn't running: files are replaced
+atomically, but without taking the per-user locks (or leaving their .lock files).
+
+Progress is saved every CHUNK_SIZE records to '<archive>.progress' (export) or
+'<archive>.import-progress' (import), so an interrupted run can be resumed.
+"""
+import argparse
+import gzip
+import hashlib
+import itertools
+import json
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import user_storage
+
+# Archive record kind -> directory holding those files
+SOURCES = {
+    "medical_history": "user_medical_histories",
+    "chat_history": "chat_histories"
+}
+
+# Records between progress checkpoints (each export checkpoint also ends a gzip member)
+CHUNK_SIZE = 1000
+
+
+def _list_files():
+    """
+    All (kind, filename) pairs to export, in a stable order.
+    This holds every name in memory (O(n) in the number of files); sorting is
+    what lets an interrupted export resume after the last checkpointed file.
+    """
+    files = []
+    for kind, directory in SOURCES.items():
+        if not os.path.isdir(directory):
+            continue
+        names = (entry.name for entry in os.scandir(directory) if entry.is_file())
+        files.extend((kind, name) for name in names if name.endswith(".json") and not name.startswith("."))
+    files.sort()
+    return files
+
+
+def _bounded_map(executor, fn, items, window):
+    """
+    Like executor.map, but only keeps `window` calls in flight, so a huge
+    input is never turned into a huge list of pending results.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _read_record(kind_and_name):
+    kind, name = kind_and_name
+    with open(os.path.join(SOURCES[kind], name), 'rb') as file:
+        content = file.read()
+    record = {
+        "kind": kind,
+        "file": name,
+        "sha256": hashlib.sha256(content).hexdigest(),
+        "content": content.decode("utf-8")
+    }
+    return (json.dumps(record) + "\n").encode("utf-8")
+
+
+def _restore_record(line):
+    """
+    Write one archived file back into place.
+    Returns the record kind, or raises ValueError if the record is damaged.
+    """
+    record = json.loads(line)
+    if record["kind"] == "end":
+        return "end"
+
+    name = record["file"]
+    if record["kind"] not in SOURCES or os.path.basename(name) != name:
+        raise ValueError(f"Invalid archive record for {name!r}")
+
+    content = record["content"]
+    if hashlib.sha256(content.encode("utf-8")).hexdigest() != record["sha256"]:
+        raise ValueError(f"Checksum mismatch for {name}")
+
+    # No per-file lock: an offline restore doesn't race the app, and the lock would leave a .lock file behind
+    user_storage.atomic_write_text(os.path.join(SOURCES[record["kind"]], name), content)
+    return record["kind"]
+
+
+def export_histories(archive_path, workers=8, resume=False):
+    """
+    Stream every medical history and chat log into archive_path.
+    Returns the number of files exported.
+    """
+    progress_path = archive_path + ".progress"
+    files = _list_files()
+    progress = user_storage.read_json(progress_path) if resume else None
+
+    done, offset = 0, 0
+    if progress:
+        # Continue after the last file of the last checkpoint, dropping anything written after it
+        last_file = tuple(progress["last_file"])
+        files = [item for item in files if item > last_file]
+        done, offset = progress["files_done"], progress["offset"]
+
+    with open(archive_path, 'r+b' if progress else 'wb') as raw:
+        raw.truncate(offset)
+        raw.seek(offset)
+
+        member = None
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            records = _bounded_map(executor, _read_record, files, workers * 4)
+            for item, line in zip(files, records):
+                if member is None:
+                    member = gzip.GzipFile(fileobj=raw, mode='wb')
+                member.write(line)
+                done += 1
+
+                if done % CHUNK_SIZE == 0:
+                    # gzip readers handle concatenated members, so each checkpoint is a clean cut
+                    member.close()
+                    member = None
+                    raw.flush()
+                    os.fsync(raw.fileno())
+                    user_storage.atomic_write_json(progress_path, {
+                        "files_done": done,
+                        "offset": raw.tell(),
+                        "last_file": list(item)
+                    })
+
+        if member is None:
+            member = gzip.GzipFile(fileobj=raw, mode='wb')
+        member.write((json.dumps({"kind": "end", "records": done}) + "\n").encode("utf-8"))
+        member.close()
+
+    if os.path.exists(progress_path):
+        os.remove(progress_path)
+    return done
+
+
+def import_histories(archive_path, workers=8, resume=False):
+    """
+    Restore every file in archive_path, overwriting existing files with the same name.
+    Returns the number of files imported.
+    """
+    progress_path = archive_path + ".import-progress"
+    progress = user_storage.read_json(progress_path) if resume else None
+    done = progress["records_done"] if progress else 0
+
+    for directory in SOURCES.values():
+        os.makedirs(directory, exist_ok=True)
+
+    complete = False
+    with gzip.open(archive_path, 'rt', encoding='utf-8') as archive:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            lines = itertools.islice(archive, done, None)
+            for kind in _bounded_map(executor, _restore_record, lines, workers * 4):
+                if kind == "end":
+                    complete = True
+                    continue
+                done += 1
+                if done % CHUNK_SIZE == 0:
+                    user_storage.atomic_write_json(progress_path, {"records_done": done})
+
+    if not complete:
+        raise ValueError(f"{archive_path} is incomplete (no end record); was the export interrupted?")
+
+    if os.path.exists(progress_path):
+        os.remove(progress_path)
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import all users' medical histories and chat logs")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("archive", help="path of the .jsonl.gz archive")
+    parser.add_argument("--workers", type=int, default=8, help="parallel file reads/writes")
+    parser.add_argument("--resume", action="store_true", help="continue an interrupted run from its last checkpoint")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        count = export_histories(args.archive, workers=args.workers, resume=args.resume)
+        print(f"Exported {count} files to {args.archive}")
+    else:
+        count = import_histories(args.archive, workers=args.workers, resume=args.resume)
+        print(f"Imported {count} files from {args.archive}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Follow-up interview for MedicalChatbot.
+
+The /diagnosis response carries a "question" that would refine the result.
+Interview asks those questions one at a time, and while the user is reading
+a question it already runs the next /diagnosis call for every possible answer,
+so the answer they pick is usually resolved by the time they reply. When an
+answer would end the interview, its /triage call is prefetched as well.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import medical_diagnosis as md
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="interview-prefetch")
+
+
+def question_options(question):
+    """
+    Turn a diagnosis question into a list of (label, evidence) answers.
+    Returns None for question types that can't be answered with a single choice.
+    """
+    items = question.get("items", [])
+
+    if question.get("type") == "single" and items:
+        item = items[0]
+        return [
+            (choice["label"], [{"id": item["id"], "choice_id": choice["id"]}])
+            for choice in item.get("choices", [])
+        ]
+
+    if question.get("type") == "group_single":
+        options = [(item["name"], [{"id": item["id"], "choice_id": "present"}]) for item in items]
+        options.append(("None of these", [{"id": item["id"], "choice_id": "absent"} for item in items]))
+        return options
+
+    return None
+
+
+def group_multiple_evidence(question, chosen):
+    """
+    Evidence for a group_multiple question: the chosen item indexes are present, the rest absent.
+    """
+    return [
+        {"id": item["id"], "choice_id": "present" if i in chosen else "absent"}
+        for i, item in enumerate(question.get("items", []))
+    ]
+
+
+class Interview:
+    def __init__(self, age, sex, evidence, diagnosis, max_questions=5, stop_probability=0.9, prefetch=True):
+        self.age = age
+        self.sex = sex
+        self.evidence = list(evidence)
+        self.diagnosis = diagnosis
+        self.max_questions = max_questions
+        self.stop_probability = stop_probability
+        self.prefetch = prefetch
+        self.questions_asked = 0
+        self.options = None
+        self.triage = None  # Triage for the current evidence, when it was prefetched
+        self._prefetched = []
+
+    @property
+    def question(self):
+        return (self.diagnosis or {}).get("question")
+
+    def should_stop(self):
+        """Check the stop conditions before asking another question"""
+        return self._stops_at(self.diagnosis)
+
+    def _stops_at(self, diagnosis):
+        if not diagnosis or not diagnosis.get("question"):
+            return True
+        if diagnosis.get("should_stop") or self.questions_asked >= self.max_questions:
+            return True
+
+        conditions = diagnosis.get("conditions") or []
+        return bool(conditions) and conditions[0]["probability"] >= self.stop_probability
+
+    def _prefetch(self, evidence):
+        """Diagnosis for one possible answer, plus triage if that answer ends the interview"""
+        diagnosis = md.get_diagnosis(self.age, self.sex, evidence)
+        triage = md.get_triage(self.age, self.sex, evidence) if diagnosis and self._stops_at(diagnosis) else None
+        return diagnosis, triage
+
+    def ask(self):
+        """
+        Prepare the current question and start prefetching the diagnosis for each answer.
+        Returns the (label, evidence) options, or None for a group_multiple question.
+        """
+        self.questions_asked += 1
+        self.options = question_options(self.question)
+        if self.prefetch:
+            self._prefetched = [
+                _executor.submit(self._prefetch, self.evidence + option_evidence)
+                for _, option_evidence in (self.options or [])
+            ]
+        return self.options
+
+    def answer(self, new_evidence, option_index=None):
+        """
+        Add the evidence for the user's answer and move on to the next diagnosis.
+        option_index picks the matching prefetched result when there is one.
+        """
+        prefetched = self._prefetched
+        self._prefetched = []
+        for i, future in enumerate(prefetched):
+            if i != option_index:
+                future.cancel()
+
+        self.evidence.extend(new_evidence)
+        diagnosis, self.triage = None, None
+        # Only wait for a prefetch that is running or done; one still queued in the shared pool is called directly
+        if option_index is not None and option_index < len(prefetched) and not prefetched[option_index].cancel():
+            try:
+                diagnosis, self.triage = prefetched[option_index].result()
+            except Exception as e:
+                print(f"Prefetched diagnosis failed, retrying: {e}")
+
+        if diagnosis is None:
+            diagnosis = md.get_diagnosis(self.age, self.sex, self.evidence)
+
+        # If the API call failed, keep the last conditions and stop asking
+        self.diagnosis = diagnosis if diagnosis is not None else dict(self.diagnosis, question=None)
+        return self.diagnosis
+
+    def cancel(self):
+        """Drop any prefetches that haven't started yet"""
+        for future in self._prefetched:
+            future.cancel()
+        self._prefetched = []
@@ -1,42 +1,70 @@
 import re
-import json
-import os
+import copy
 from datetime import datetime
 
 # Import your existing modules
 # This assumes your current code is in a file called medical_diagnosis.py
 import medical_diagnosis as md
+import chatbot_responses as responses
+import user_storage
+from speculation import SpeculativeDiagnosis
+from interview import Interview, group_multiple_evidence
+
+# Number of symptom matches shown per searched phrase on each page
+SYMPTOM_PAGE_SIZE = 5
+
+# Start diagnosis in the background whenever the symptom list changes
+SPECULATIVE_DIAGNOSIS = True
+
+# Follow-up questions asked after "done" (set INTERVIEW_MAX_QUESTIONS to 0 to skip them).
+# The interview also stops once the top condition reaches INTERVIEW_STOP_PROBABILITY.
+INTERVIEW_MAX_QUESTIONS = 5
+INTERVIEW_STOP_PROBABILITY = 0.9
+INTERVIEW_PREFETCH = True
 
 class MedicalChatbot:
     def __init__(self):
         self.current_user = None
         self.user_data = None
+        self.user_data_base = None  # user_data as last loaded/saved, used to merge with other sessions
         self.conversation_state = "greeting"
         self.current_symptoms = []
         self.symptom_names = []
+        self.speculation = SpeculativeDiagnosis(enabled=SPECULATIVE_DIAGNOSIS, on_ready=self._on_diagnosis_ready)
+        self.interview = None
         self.age = None
         self.sex = None
-        self.current_symptom_results = None
+        self.current_symptom_results = None  # Only the page of results currently on screen
+        self.symptom_search_phrases = []  # Phrases that still have more results to page through
+        self.symptom_search_page = 0
         self.conversation_history = []
+        self.saved_chat_count = 0  # How many conversation_history entries are already on disk
         self.current_medical_category = None  # Added to track the current medical category being edited
+        self.last_response_data = None  # Structured version of the last list response, for the web client
+        self.push = None  # Set by transports that can send the client messages unprompted (the WebSocket in app.py)
 
     def save_chat_history(self):
-        """Save the current conversation history to a file"""
+        """Append the messages not saved yet to the user's chat history file"""
         if not self.current_user:
             return False
 
-        if not os.path.exists('chat_histories'):
-            os.makedirs('chat_histories')
-
         filename = f"chat_histories/{self.current_user.lower().replace(' ', '_')}_chat_history.json"
+        new_messages = self.conversation_history[self.saved_chat_count:]
         try:
-            with open(filename, 'w') as file:
-                json.dump(self.conversation_history, file, indent=4)
+            # Other sessions for the same user append to this file too, so merge instead of overwriting
+            user_storage.update_json(filename, lambda saved: saved + new_messages, default=[])
+            self.saved_chat_count = len(self.conversation_history)
             return True
         except Exception as e:
             print(f"Error saving chat history: {e}")
             return False
 
+    def _on_diagnosis_ready(self):
+        """Let the client know the background diagnosis finished, so "done" will be instant"""
+        push = self.push
+        if push is not None:
+            push({"type": "event", "event": "diagnosis_ready"})
+
     def process_message(self, message):
         """Process user messages and return appropriate responses"""
         # Add user message to history
@@ -45,6 +73,7 @@ class MedicalChatbot:
 
         # Convert message to lowercase for easier pattern matching
         message_lower = message.lower()
+        self.last_response_data = None
 
         # Handle different conversation states
         if self.conversation_state == "greeting":
@@ -61,6 +90,8 @@ class MedicalChatbot:
             response = self._handle_symptoms(message_lower)
         elif self.conversation_state == "select_symptom":
             response = self._handle_symptom_selection(message_lower)
+        elif self.conversation_state == "interview":
+            response = self._handle_interview(message_lower)
         elif self.conversation_state == "diagnosis_complete":
             response = self._handle_post_diagnosis(message_lower)
         elif self.conversation_state == "medical_history":
@@ -80,7 +111,7 @@ class MedicalChatbot:
         """Handle initial greeting and guide user to login"""
         if any(word in message for word in ["hi", "hello", "hey", "start", "begin"]):
             self.conversation_state = "get_username"
-            return "👋 Welcome to the AI Health Assistant! I can help you manage your medical history and analyze your symptoms. What's your username?"
+            return responses.GREETING_PROMPT
         else:
             return "👋 Hello! I'm your AI Health Assistant. To get started, please say hi or hello."
 
@@ -105,10 +136,10 @@ class MedicalChatbot:
         else:
             welcome_msg = f"Welcome back, {username}! I've loaded your medical history. What would you like to do today?"
 
+        self.user_data_base = copy.deepcopy(self.user_data)
         self.conversation_state = "main_menu"
-        menu = "\n1️⃣ Manage Medical History\n2️⃣ Symptom Diagnosis\n3️⃣ View Previous Diagnoses"
 
-        return welcome_msg + menu
+        return welcome_msg + "\n" + responses.MAIN_MENU
 
     def _handle_main_menu(self, message):
         """Process main menu selections"""
@@ -116,36 +147,25 @@ class MedicalChatbot:
             self.conversation_state = "medical_history"
             # Reset the current medical category
             self.current_medical_category = None
-            return "Let's manage your medical history. What would you like to update?\n1️⃣ Chronic Conditions\n2️⃣ Allergies\n3️⃣ Medications\n4️⃣ Previous Surgeries\n5️⃣ Return to Main Menu"
+            return responses.MEDICAL_HISTORY_PROMPT
 
         elif re.search(r"2|symptom|diagnos|check", message):
             self.conversation_state = "get_age"
             self.current_symptoms = []
             self.symptom_names = []
+            self.speculation.discard()
             return "I'll help you analyze your symptoms. First, what is your age?"
 
         elif re.search(r"3|view|previous|past", message):
             if not self.user_data.get('previous_predictions') or len(self.user_data['previous_predictions']) == 0:
-                return "You don't have any previous diagnoses saved. Would you like to start a new symptom check?\n1️⃣ Yes, start new symptom check\n2️⃣ No, return to main menu"
+                return responses.NO_PREVIOUS_DIAGNOSES
 
             # Show the most recent diagnoses (up to 3)
-            recent_diagnoses = self.user_data['previous_predictions'][-3:]
-            response = "Here are your most recent diagnoses:\n\n"
-
-            for i, diagnosis in enumerate(recent_diagnoses, 1):
-                date = diagnosis.get('date', 'Unknown date')
-                symptoms = ", ".join(diagnosis.get('symptoms', []))
-                conditions = ", ".join([f"{c['name']} ({c['probability']:.1f}%)" for c in diagnosis.get('conditions', [][:2])])
-
-                response += f"Diagnosis {i} ({date}):\n"
-                response += f"Symptoms: {symptoms}\n"
-                response += f"Top conditions: {conditions}\n\n"
-
-            response += "What would you like to do next?\n1️⃣ Start new symptom check\n2️⃣ Return to main menu"
+            response, self.last_response_data = responses.render_previous_diagnoses(self.user_data['previous_predictions'][-3:])
             return response
 
         else:
-            return "I didn't understand your selection. Please choose one of the following:\n1️⃣ Manage Medical History\n2️⃣ Symptom Diagnosis\n3️⃣ View Previous Diagnoses"
+            return responses.MAIN_MENU_INVALID
 
     def _handle_age(self, message):
         """Process age input"""
@@ -166,11 +186,11 @@ class MedicalChatbot:
         if "male" in message:
             self.sex = "male"
             self.conversation_state = "get_symptoms"
-            return "Now, please tell me what symptoms you're experiencing. You can enter one symptom at a time."
+            return responses.ASK_SYMPTOMS_PROMPT
         elif "female" in message:
             self.sex = "female"
             self.conversation_state = "get_symptoms"
-            return "Now, please tell me what symptoms you're experiencing. You can enter one symptom at a time."
+            return responses.ASK_SYMPTOMS_PROMPT
         else:
             return "Please specify either 'male' or 'female' for accurate diagnostic purposes."
 
@@ -181,45 +201,56 @@ class MedicalChatbot:
             return "You haven't added any symptoms yet. Please tell me what symptoms you're experiencing, or type 'cancel' to go back to the main menu."
 
         # Move to diagnosis
-        diagnosis = md.get_diagnosis(self.age, self.sex, self.current_symptoms)
-        triage = md.get_triage(self.age, self.sex, self.current_symptoms)
+        # Usually already computed in the background while the user was adding symptoms
+        diagnosis = self.speculation.take_diagnosis(self.age, self.sex, self.current_symptoms)
+
+        # Refine the result with the API's follow-up questions before showing it
+        self.interview = Interview(
+            self.age, self.sex, self.current_symptoms, diagnosis,
+            max_questions=INTERVIEW_MAX_QUESTIONS, stop_probability=INTERVIEW_STOP_PROBABILITY,
+            prefetch=INTERVIEW_PREFETCH
+        )
+        if not self.interview.should_stop():
+            self.conversation_state = "interview"
+            return self._ask_interview_question()
+
+        self.interview = None
+        triage = self.speculation.take_triage(self.age, self.sex, self.current_symptoms)
+        return self._complete_diagnosis(diagnosis, triage)
 
-        response = "Based on your symptoms, here's what I found:\n\n"
+     elif message == "cancel":
+        self.speculation.discard()
+        self.conversation_state = "main_menu"
+        return responses.SYMPTOM_CHECK_CANCELLED
 
+     else:
+        # Split the message into separate symptoms and search them all in parallel
+        response = self._show_symptom_page(self._split_symptom_phrases(message), 0)
+        if response is None:
+            return "I couldn't find any matching symptoms. Please try a different description or type 'done' if you've finished adding symptoms."
+
+        self.conversation_state = "select_symptom"
+        return response
+
+    def _complete_diagnosis(self, diagnosis, triage):
+        """Show the diagnosis and triage result and add it to the user's predictions"""
         conditions = []
         if diagnosis and "conditions" in diagnosis:
-            response += "🩺 Possible Conditions:\n"
             for condition in diagnosis["conditions"][:3]:  # Limit to top 3
-                prob = condition['probability'] * 100
-                response += f"- {condition['name']} (Probability: {prob:.1f}%)\n"
                 conditions.append({
                     "name": condition['name'],
-                    "probability": prob
+                    "probability": condition['probability'] * 100
                 })
 
         triage_info = None
         if triage:
-            response += "\n🚑 Recommended Next Steps:\n"
             triage_level = triage.get('triage_level', 'unknown')
-
-            recommendations = {
-                "self_care": "Your symptoms suggest you can manage this with self-care. Monitor your condition and rest.",
-                "consultation": "Consider scheduling a consultation with a healthcare provider.",
-                "emergency": "Seek immediate medical attention. Your symptoms may indicate a serious condition."
-            }
-
-            recommendation = recommendations.get(triage_level, "Consult with a healthcare professional for guidance.")
-            response += recommendation + "\n"
-
             triage_info = {
                 "level": triage_level,
-                "recommendation": recommendation,
+                "recommendation": responses.TRIAGE_RECOMMENDATIONS.get(triage_level, responses.DEFAULT_RECOMMENDATION),
                 "teleconsultation_applicable": triage.get('teleconsultation_applicable', False)
             }
 
-            if triage.get('teleconsultation_applicable'):
-                response += "\n💻 A telehealth consultation may be appropriate for your condition."
-
         # Create and save prediction
         prediction = {
             "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
@@ -233,67 +264,204 @@ class MedicalChatbot:
         # Add to user data
         self.user_data['previous_predictions'].append(prediction)
 
-        # Ask about saving
-        response += "\nWould you like me to save this diagnosis to your medical history? (yes/no)"
+        # Render the result and ask about saving
+        response, self.last_response_data = responses.render_diagnosis(conditions, triage_info)
         self.conversation_state = "diagnosis_complete"
 
         return response
 
-     elif message == "cancel":
-        self.conversation_state = "main_menu"
-        return "Symptom check cancelled. What would you like to do?\n1️⃣ Manage Medical History\n2️⃣ Symptom Diagnosis\n3️⃣ View Previous Diagnoses"
+    def _ask_interview_question(self):
+        """Ask the current follow-up question; answers are prefetched while the user reads it"""
+        options = self.interview.ask()
+        response, self.last_response_data = responses.render_question(self.interview.question, options)
+        return response
 
-     else:
-        # Search for the symptom
-        symptom_results = md.search_symptoms(message, self.age, self.sex)
+    def _handle_interview(self, message):
+        """Handle the answer to a follow-up question"""
+        if message in ["stop", "skip", "done"]:
+            return self._finish_interview()
 
-        if symptom_results and isinstance(symptom_results, list) and len(symptom_results) > 0:
-            self.current_symptom_results = symptom_results
+        if message == "cancel":
+            self.speculation.discard()
+            self.interview.cancel()
+            self.interview = None
+            self.conversation_state = "main_menu"
+            return responses.SYMPTOM_CHECK_CANCELLED
+
+        question = self.interview.question
+        options = self.interview.options
+        option_index = None
+
+        if options is None:
+            # group_multiple: any number of the listed items can apply
+            items = question.get("items", [])
+            if message == "none":
+                chosen = []
+            elif re.fullmatch(r"\d+(?:\s*(?:,|and|\s)\s*\d+)*", message.strip()):
+                chosen = [int(number) - 1 for number in re.findall(r"\d+", message)]
+                if not all(0 <= i < len(items) for i in chosen):
+                    return f"Please choose numbers between 1 and {len(items)}, or type 'none'."
+            else:
+                return "Please reply with the numbers of all that apply (e.g. 1,3), 'none', or 'stop'."
+            new_evidence = group_multiple_evidence(question, chosen)
+        else:
+            labels = [label.lower() for label, _ in options]
+            if re.fullmatch(r"\d+", message.strip()) and 1 <= int(message) <= len(options):
+                option_index = int(message) - 1
+            elif message.strip() in labels:
+                option_index = labels.index(message.strip())
+            elif message.strip() == "none" and question.get("type") == "group_single":
+                # The last group_single option is "None of these"
+                option_index = len(options) - 1
+            else:
+                return f"Please reply with a number between 1 and {len(options)}, or type 'stop' to see your results now."
+            new_evidence = options[option_index][1]
+
+        # Confirmed symptoms show up in the saved prediction alongside the ones the user entered
+        names = {item["id"]: item["name"] for item in question.get("items", [])}
+        for evidence in new_evidence:
+            if evidence["choice_id"] == "present":
+                self.symptom_names.append(names[evidence["id"]])
+
+        # The evidence changes, so the speculative triage for the entered symptoms is of no use now
+        self.speculation.discard()
+        self.interview.answer(new_evidence, option_index)
+        if self.interview.should_stop():
+            return self._finish_interview()
+        return self._ask_interview_question()
+
+    def _finish_interview(self):
+        """Stop asking questions and show the result for all the evidence gathered"""
+        interview = self.interview
+        self.interview = None
+        interview.cancel()
+
+        self.current_symptoms = interview.evidence
+        triage = interview.triage
+        if triage is None:
+            # Usually prefetched with the last answer; if the user stopped before answering
+            # anything, the speculative triage for the entered symptoms still applies
+            triage = self.speculation.take_triage(self.age, self.sex, self.current_symptoms)
+        return self._complete_diagnosis(interview.diagnosis, triage)
+
+    def _show_symptom_page(self, phrases, page):
+        """
+        Search phrases for the given page of results and render it.
+        Returns None, leaving the page on screen selectable, if nothing was found.
+        """
+        # Ask for one extra result per phrase so we know whether another page exists
+        search_results = md.search_symptoms_many(
+            phrases, self.age, self.sex,
+            limit=SYMPTOM_PAGE_SIZE + 1, offset=page * SYMPTOM_PAGE_SIZE
+        )
+
+        page_results = []
+        more_phrases = []
+        groups = []
+        not_found = []
+        for phrase, symptom_results in search_results:
+            if symptom_results and isinstance(symptom_results, list):
+                if len(symptom_results) > SYMPTOM_PAGE_SIZE:
+                    more_phrases.append(phrase)
+                    symptom_results = symptom_results[:SYMPTOM_PAGE_SIZE]
+                groups.append((phrase, symptom_results))
+                page_results.extend(symptom_results)
+            else:
+                not_found.append(phrase)
 
-            response = "I found these matching symptoms. Please select one by number:\n"
-            # Display all results instead of limiting to 5
-            for i, symptom in enumerate(symptom_results, 1):
-                response += f"{i}. {symptom['name']} (Common Name: {symptom['common_name']})\n"
+        if not page_results:
+            return None
+
+        self.current_symptom_results = page_results
+        self.symptom_search_phrases = more_phrases
+        self.symptom_search_page = page
+        response, self.last_response_data = responses.render_symptom_results(
+            groups, not_found, has_more=bool(more_phrases)
+        )
+        return response
+
+    def _split_symptom_phrases(self, message):
+        """Split a message like 'fever, cough and headache' into separate symptom phrases"""
+        phrases = []
+        for phrase in re.split(r",|;|&|\band\b|\bplus\b", message):
+            phrase = phrase.strip()
+            if phrase and phrase not in phrases:
+                phrases.append(phrase)
+        return phrases or [message.strip()]
 
-            response += "\nOr type 'none' if none of these match your symptom."
-            self.conversation_state = "select_symptom"
-            return response
-        else:
-            return "I couldn't find any matching symptoms. Please try a different description or type 'done' if you've finished adding symptoms."
     def _handle_symptom_selection(self, message):
         """Handle symptom selection from search results"""
         if message == "none":
             self.conversation_state = "get_symptoms"
             return "No problem. Please try describing your symptom differently, or enter another symptom."
 
-        try:
-            if re.match(r'^\d+$', message):
-                choice = int(message)
-                if 1 <= choice <= len(self.current_symptom_results):
-                    selected_symptom = self.current_symptom_results[choice-1]
-                    symptom_id = selected_symptom["id"]
-
-                    self.current_symptoms.append({"id": symptom_id, "choice_id": "present"})
-                    self.symptom_names.append(selected_symptom['name'])
-
-                    self.conversation_state = "get_symptoms"
-                    return f"Added symptom: {selected_symptom['name']}. Please tell me another symptom, or type 'done' if you've entered all your symptoms."
-                else:
-                    return f"Please select a number between 1 and {len(self.current_symptom_results)}, or type 'none'."
-            else:
-                return "Please enter just the number of the symptom you want to select, or type 'none'."
-        except ValueError:
-            return "I didn't understand your selection. Please enter the number next to the symptom."
+        if message.strip() == "more":
+            if not self.symptom_search_phrases:
+                return "There are no more matches. Please select by number, or type 'none'."
+
+            response = self._show_symptom_page(self.symptom_search_phrases, self.symptom_search_page + 1)
+            if response is None:
+                return "There are no more matches. Please select by number, or type 'none'."
+            return response
+
+        # Accept a single number or a list like "1,3,5" / "1 3 and 5"
+        if not re.fullmatch(r"\d+(?:\s*(?:,|and|\s)\s*\d+)*", message.strip()):
+            return "Please enter the numbers of the symptoms you want to select (e.g. 1 or 1,3), or type 'none'."
+
+        choices = []
+        for number in re.findall(r"\d+", message):
+            choice = int(number)
+            if not 1 <= choice <= len(self.current_symptom_results):
+                return f"Please select numbers between 1 and {len(self.current_symptom_results)}, or type 'none'."
+            if choice not in choices:
+                choices.append(choice)
+
+        added = []
+        for choice in choices:
+            selected_symptom = self.current_symptom_results[choice-1]
+            symptom_id = selected_symptom["id"]
+
+            # Skip symptoms that were already added earlier in this check
+            if any(symptom["id"] == symptom_id for symptom in self.current_symptoms):
+                continue
+
+            self.current_symptoms.append({"id": symptom_id, "choice_id": "present"})
+            self.symptom_names.append(selected_symptom['name'])
+            added.append(selected_symptom['name'])
+
+        self.conversation_state = "get_symptoms"
+        if not added:
+            return "Those symptoms are already on your list. Please tell me another symptom, or type 'done' if you've entered all your symptoms."
+
+        # Get a head start on the diagnosis for the symptoms so far
+        self.speculation.update(self.age, self.sex, self.current_symptoms)
+
+        label = "symptom" if len(added) == 1 else "symptoms"
+        return f"Added {label}: {', '.join(added)}. Please tell me another symptom, or type 'done' if you've entered all your symptoms."
+
+    def _save_user_data(self):
+        """
+        Save user_data, picking up any changes other sessions saved in the meantime.
+        Returns False if saving failed.
+        """
+        saved = md.save_medical_history(self.user_data, self.current_user, base=self.user_data_base)
+        if saved is None:
+            return False
+
+        self.user_data = saved
+        self.user_data_base = copy.deepcopy(saved)
+        return True
 
     def _handle_post_diagnosis(self, message):
         """Handle user response after diagnosis"""
         if message in ["yes", "y", "sure", "save"]:
-            md.save_medical_history(self.user_data, self.current_user)
             self.conversation_state = "main_menu"
-            return "I've saved your diagnosis to your medical history. What would you like to do next?\n1️⃣ Manage Medical History\n2️⃣ Start Another Symptom Check\n3️⃣ View Previous Diagnoses"
+            if not self._save_user_data():
+                return responses.DIAGNOSIS_SAVE_FAILED
+            return responses.DIAGNOSIS_SAVED
         else:
             self.conversation_state = "main_menu"
-            return "I haven't saved this diagnosis. What would you like to do next?\n1️⃣ Manage Medical History\n2️⃣ Start Another Symptom Check\n3️⃣ View Previous Diagnoses"
+            return responses.DIAGNOSIS_NOT_SAVED
 
     def _handle_medical_history(self, message):
         """Handle medical history management"""
@@ -323,9 +491,10 @@ class MedicalChatbot:
             return f"Previous Surgeries: {current}\n\nTo add a surgery, type 'add [surgery]'\nTo remove, type 'remove [surgery]'\nType 'done' when finished."
 
         elif re.search(r"5|return|back|main", message) or message == "done":
-            md.save_medical_history(self.user_data, self.current_user)
             self.conversation_state = "main_menu"
-            return "Medical history updated and saved. What would you like to do next?\n1️⃣ Manage Medical History\n2️⃣ Symptom Diagnosis\n3️⃣ View Previous Diagnoses"
+            if not self._save_user_data():
+                return responses.MEDICAL_HISTORY_SAVE_FAILED
+            return responses.MEDICAL_HISTORY_SAVED
 
         # Check for add/remove commands
         elif add_match and self.current_medical_category:
@@ -347,7 +516,7 @@ class MedicalChatbot:
 
         else:
             if not self.current_medical_category:
-                return "Please select a category to update first:\n1️⃣ Chronic Conditions\n2️⃣ Allergies\n3️⃣ Medications\n4️⃣ Previous Surgeries\n5️⃣ Return to Main Menu"
+                return responses.SELECT_CATEGORY_PROMPT
             else:
                 return "I didn't understand that command. To add an item, type 'add [item]'. To remove an item, type 'remove [item]'. Or type 'done' to finish."
 
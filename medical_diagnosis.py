@@ -2,6 +2,11 @@ import requests
 import sys
 import json
 import os
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+
+import api_cassette
+import user_storage
 
 # Replace with your Infermedica API credentials
 
@@ -12,28 +17,52 @@ APP_ID = os.getenv("APP_ID")
 APP_KEY = os.getenv("APP_KEY")
 API_URL = os.getenv("API_URL")
 
+# Record/replay transport for the API calls, see api_cassette (None = always call the live API)
+CASSETTE = api_cassette.from_env()
+
+
 
 
+# List fields that concurrent sessions can edit independently and get merged on save
+MEDICAL_HISTORY_LIST_FIELDS = ['chronic_conditions', 'allergies', 'medications', 'previous_surgeries', 'previous_predictions']
 
-def save_medical_history(medical_history, username):
+def _medical_history_filename(username):
+    return f"user_medical_histories/{username.lower().replace(' ', '_')}_medical_history.json"
+
+def save_medical_history(medical_history, username, base=None):
     """
-    Save the user's medical history to a JSON file
+    Save the user's medical history to a JSON file.
+    Each save bumps a '_version' field. If the file was changed by another session
+    since medical_history was loaded, the list fields are merged against base
+    (the copy as it was loaded) instead of overwriting the other session's changes.
+    Returns the saved history, or None if saving failed.
     """
-    if not os.path.exists('user_medical_histories'):
-        os.makedirs('user_medical_histories')
-    filename = f"user_medical_histories/{username.lower().replace(' ', '_')}_medical_history.json"
+    def merge(current):
+        if current is None or current.get('_version', 0) == medical_history.get('_version', 0):
+            saved = dict(medical_history)
+        else:
+            saved = dict(current)
+            saved.update({key: value for key, value in medical_history.items() if key not in MEDICAL_HISTORY_LIST_FIELDS})
+            for field in MEDICAL_HISTORY_LIST_FIELDS:
+                saved[field] = user_storage.merge_list(
+                    (base or {}).get(field, []), medical_history.get(field, []), current.get(field, [])
+                )
+        saved['_version'] = (current or {}).get('_version', 0) + 1
+        return saved
+
     try:
-        with open(filename, 'w') as file:
-            json.dump(medical_history, file, indent=4)
+        saved = user_storage.update_json(_medical_history_filename(username), merge)
         print(f"Medical history saved successfully for {username}")
+        return saved
     except Exception as e:
         print(f"Error saving medical history: {e}")
+        return None
 
 def load_medical_history(username):
     """
     Load a user's medical history from a JSON file
     """
-    filename = f"user_medical_histories/{username.lower().replace(' ', '_')}_medical_history.json"
+    filename = _medical_history_filename(username)
     try:
         with open(filename, 'r') as file:
             return json.load(file)
@@ -48,16 +77,32 @@ def delete_medical_history(username):
     """
     Delete a user's medical history file
     """
-    filename = f"user_medical_histories/{username.lower().replace(' ', '_')}_medical_history.json"
+    filename = _medical_history_filename(username)
     try:
-        if os.path.exists(filename):
-            os.remove(filename)
+        if user_storage.delete_file(filename):
             print(f"Medical history for {username} has been successfully deleted.")
         else:
             print(f"No medical history found for {username}.")
     except Exception as e:
         print(f"Error deleting medical history: {e}")
 
+def _api_request(method, endpoint, params=None, json=None):
+    """
+    Send a request to the Infermedica API, going through the cassette when record/replay is on.
+    """
+    headers = {
+        "App-Id": APP_ID,
+        "App-Key": APP_KEY,
+        "Content-Type": "application/json",
+    }
+
+    def send():
+        return requests.request(method, f"{API_URL}{endpoint}", headers=headers, params=params, json=json)
+
+    if CASSETTE is not None:
+        return CASSETTE.request(method, endpoint, send, params=params, json=json)
+    return send()
+
 def check_exit():
     """
     Provide a quick option to exit the program
@@ -67,58 +112,97 @@ def check_exit():
         print("👋 Exiting the program. Goodbye!")
         sys.exit(0)
 
-def search_symptoms(symptom_name, age, sex):
+def _symptom_match_rank(phrase, symptom):
+    """
+    Rank how well a symptom matches the searched phrase (lower is better).
+    Exact and prefix matches on the name or common name come before plain
+    substring matches. Returns None if the phrase appears in neither name.
+    """
+    name = symptom['name'].lower()
+    common_name = symptom['common_name'].lower()
+
+    if phrase == name:
+        return 0
+    if phrase == common_name:
+        return 1
+    if name.startswith(phrase):
+        return 2
+    if common_name.startswith(phrase):
+        return 3
+    if phrase in name:
+        return 4
+    if phrase in common_name:
+        return 5
+    return None
+
+def search_symptoms(symptom_name, age, sex, limit=None, offset=0):
     """
     Search for symptoms using Infermedica's /symptoms endpoint.
+    Results are ranked by how well they match the phrase; pass limit/offset
+    to get a single page of the ranked list instead of every match.
     """
     #check_exit()  # Added simple exit check
 
-    headers = {
-        "App-Id": APP_ID,
-        "App-Key": APP_KEY,
-        "Content-Type": "application/json",
-    }
-
     params = {
         "phrase": symptom_name,
         "age.value": age,
         "sex": sex
     }
 
-    response = requests.get(f"{API_URL}symptoms", headers=headers, params=params)
+    response = _api_request("GET", "symptoms", params=params)
 
     if response.status_code == 200:
         results = response.json()
-        # Filter results to find the most relevant symptom
-        matching_symptoms = [
-            symptom for symptom in results
-            if symptom_name.lower() in symptom['name'].lower() or
-               symptom_name.lower() in symptom['common_name'].lower()
-        ]
-        return matching_symptoms or results
+        phrase = symptom_name.lower().strip()
+
+        # Rank the matching symptoms, keeping the upstream order for ties
+        ranked = []
+        for i, symptom in enumerate(results):
+            rank = _symptom_match_rank(phrase, symptom)
+            if rank is not None:
+                ranked.append((rank, i, symptom))
+
+        # Nothing matched the phrase directly, so fall back to the upstream order
+        if not ranked:
+            ranked = [(0, i, symptom) for i, symptom in enumerate(results)]
+
+        if limit is None:
+            ranked.sort()
+        else:
+            ranked = heapq.nsmallest(offset + limit, ranked)
+        return [symptom for _, _, symptom in ranked[offset:]]
     else:
         print(f"❌ Symptom Search Error: {response.status_code} - {response.text}")
         return None
 
+def search_symptoms_many(symptom_names, age, sex, limit=None, offset=0, max_workers=4):
+    """
+    Search several symptom phrases at once, running the /symptoms lookups in parallel.
+    limit/offset apply to each phrase separately.
+    Returns a list of (phrase, results) pairs in the same order as the phrases.
+    """
+    if not symptom_names:
+        return []
+
+    workers = min(max_workers, len(symptom_names))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda name: search_symptoms(name, age, sex, limit, offset), symptom_names))
+
+    return list(zip(symptom_names, results))
+
 def get_diagnosis(age, sex, symptoms):
     """
     Send symptoms to Infermedica API and get predicted diseases.
     """
     # check_exit()  # Added simple exit check
 
-    headers = {
-        "App-Id": APP_ID,
-        "App-Key": APP_KEY,
-        "Content-Type": "application/json",
-    }
-
     data = {
         "sex": sex,
         "age": {"value": age},
         "evidence": symptoms,
     }
 
-    response = requests.post(f"{API_URL}diagnosis", headers=headers, json=data)
+    response = _api_request("POST", "diagnosis", json=data)
 
     if response.status_code == 200:
         return response.json()
@@ -132,19 +216,13 @@ def get_triage(age, sex, symptoms):
     """
     #heck_exit()  # Added simple exit check
 
-    headers = {
-        "App-Id": APP_ID,
-        "App-Key": APP_KEY,
-        "Content-Type": "application/json",
-    }
-
     data = {
         "sex": sex,
         "age": {"value": age},
         "evidence": symptoms,
     }
 
-    response = requests.post(f"{API_URL}triage", headers=headers, json=data)
+    response = _api_request("POST", "triage", json=data)
 
     if response.status_code == 200:
         return response.json()
@@ -0,0 +1,137 @@
+"""
+Speculative diagnosis for MedicalChatbot.
+
+Every time the symptom list changes, the diagnosis and triage calls for that
+evidence are started in the background, so by the time the user types "done"
+the results are usually ready. A newer symptom list supersedes the running calls.
+"""
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import medical_diagnosis as md
+
+# Shared by all chatbot sessions, so the number of background threads stays bounded
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="speculative-diagnosis")
+
+# Counted per API call: each symptom list starts one /diagnosis and one /triage call
+_stats = {
+    "started": 0,       # background calls submitted
+    "hits": 0,          # results used from a background call
+    "misses": 0,        # results the chatbot had to fetch itself
+    "cancelled": 0,     # superseded before they started, so never sent
+    "wasted_calls": 0   # calls made for results that were never used
+}
+_stats_lock = threading.Lock()
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def speculation_stats():
+    """
+    Return a snapshot of the speculation counters plus the hit rate.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else None
+    return stats
+
+
+class SpeculativeDiagnosis:
+    def __init__(self, enabled=True, on_ready=None):
+        self.enabled = enabled
+        self.on_ready = on_ready  # Called from a worker thread once both current calls have finished
+        self._key = None
+        self._futures = {}  # "diagnosis"/"triage" -> future, for the evidence in _key
+        self._reported = False
+        self._lock = threading.Lock()
+
+    def _evidence_key(self, age, sex, evidence):
+        return json.dumps([age, sex, evidence], sort_keys=True)
+
+    def update(self, age, sex, evidence):
+        """
+        Start diagnosis and triage for the current evidence in the background,
+        replacing any calls for an older symptom list.
+        """
+        if not self.enabled:
+            return
+
+        self.discard()
+        # Copy the evidence so later changes to the symptom list don't leak into the calls
+        evidence = [dict(item) for item in evidence]
+        futures = {
+            "diagnosis": _executor.submit(md.get_diagnosis, age, sex, evidence),
+            "triage": _executor.submit(md.get_triage, age, sex, evidence)
+        }
+        with self._lock:
+            self._key = self._evidence_key(age, sex, evidence)
+            self._futures = futures
+            self._reported = False
+        for future in futures.values():
+            future.add_done_callback(self._call_done)
+        _count("started", len(futures))
+
+    def _call_done(self, future):
+        # Report the current symptom list once, when both of its calls have finished and neither was taken yet
+        with self._lock:
+            futures = list(self._futures.values())
+            ready = (not self._reported and future in futures and len(futures) == 2
+                     and all(f.done() and not f.cancelled() for f in futures))
+            if ready:
+                self._reported = True
+        if ready and self.on_ready is not None:
+            self.on_ready()
+
+    def discard(self):
+        """Drop the background calls that haven't been taken, if any"""
+        with self._lock:
+            futures = list(self._futures.values())
+            self._key = None
+            self._futures = {}
+
+        for future in futures:
+            if future.cancel():
+                _count("cancelled")
+            else:
+                _count("wasted_calls")
+
+    def _take(self, name, call, age, sex, evidence):
+        """
+        Return the result of one call for the evidence, from the background call
+        when it is running or finished for exactly this evidence, and from the API otherwise.
+        """
+        with self._lock:
+            matches = self._key == self._evidence_key(age, sex, evidence)
+            future = self._futures.pop(name, None) if matches else None
+        if not matches:
+            self.discard()
+
+        # A call still queued behind other sessions' calls would only be slower than calling now
+        if future is not None and future.cancel():
+            _count("cancelled")
+            future = None
+
+        if future is not None:
+            try:
+                result = future.result()
+                _count("hits")
+                return result
+            except Exception as e:
+                print(f"Speculative {name} failed, retrying: {e}")
+
+        if self.enabled:
+            _count("misses")
+        return call(age, sex, evidence)
+
+    def take_diagnosis(self, age, sex, evidence):
+        """The /diagnosis result for the evidence; the triage call is left running"""
+        return self._take("diagnosis", md.get_diagnosis, age, sex, evidence)
+
+    def take_triage(self, age, sex, evidence):
+        """The /triage result for the evidence"""
+        return self._take("triage", md.get_triage, age, sex, evidence)
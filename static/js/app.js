@@ -4,6 +4,11 @@ document.addEventListener('DOMContentLoaded', function() {
   const messageInput = document.getElementById('message-input');
   const sendButton = document.getElementById('send-button');
   const usernameDisplay = document.getElementById('username');
+  const defaultPlaceholder = messageInput.placeholder;
+  
+  // WebSocket to the server when available; messages go over POST /api/chat otherwise
+  let socket = null;
+  const pendingMessages = [];
   
   // Initialize chat with a welcome message
   addMessage('bot', '👋 Welcome to the AI Health Assistant! I can help you manage your medical history and analyze your symptoms. What\'s your username?');
@@ -47,6 +52,8 @@ document.addEventListener('DOMContentLoaded', function() {
   // Load chat history if available
   loadChatHistory();
   
+  connectSocket();
+  
   // Functions
   function sendMessage() {
       const message = messageInput.value.trim();
@@ -57,8 +64,15 @@ document.addEventListener('DOMContentLoaded', function() {
       
       // Clear input
       messageInput.value = '';
+      messageInput.placeholder = defaultPlaceholder;
       
       // Send message to the backend
+      if (socket && socket.readyState === WebSocket.OPEN) {
+          pendingMessages.push(message);
+          socket.send(JSON.stringify({ message: message }));
+          return;
+      }
+      
       fetch('/api/chat', {
           method: 'POST',
           headers: {
@@ -67,21 +81,67 @@ document.addEventListener('DOMContentLoaded', function() {
           body: JSON.stringify({ message: message })
       })
       .then(response => response.json())
-      .then(data => {
-          // Add bot response to the chat
-          addMessage('bot', data.message);
-          
-          // Update username if set
-          if (message && !usernameDisplay.innerText !== 'Guest') {
-              usernameDisplay.innerText = message;
-          }
-      })
+      .then(data => showReply(data, message))
       .catch(error => {
           console.error('Error:', error);
           addMessage('bot', 'Sorry, there was an error processing your request.');
       });
   }
   
+  function showReply(data, message) {
+      // Add bot response to the chat, using the structured list when the server sent one
+      if (data.data) {
+          addStructuredMessage(data.data);
+      } else {
+          addMessage('bot', data.message);
+      }
+      
+      // Update username if set
+      if (message && !usernameDisplay.innerText !== 'Guest') {
+          usernameDisplay.innerText = message;
+      }
+  }
+  
+  function connectSocket() {
+      if (!('WebSocket' in window)) return;
+      
+      const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+      const ws = new WebSocket(`${protocol}//${window.location.host}/ws/chat`);
+      
+      ws.addEventListener('open', () => {
+          socket = ws;
+      });
+      
+      ws.addEventListener('message', event => {
+          const data = JSON.parse(event.data);
+          
+          if (data.type === 'reply') {
+              // Replies come back in the order the messages were sent
+              const message = pendingMessages.shift();
+              if (data.error) {
+                  console.error('WebSocket error:', data.error);
+                  addMessage('bot', 'Sorry, there was an error processing your request.');
+              } else {
+                  showReply(data, message);
+              }
+          } else if (data.type === 'event' && data.event === 'diagnosis_ready') {
+              // "done" may still lead to follow-up questions, so this only says the analysis is ready
+              messageInput.placeholder = "Analysis ready - type 'done' when you've added all your symptoms";
+          } else if (data.error) {
+              console.error('WebSocket error:', data.error);
+          }
+      });
+      
+      // Without a socket (no server support, or it dropped) we fall back to POST
+      ws.addEventListener('close', () => {
+          socket = null;
+          if (pendingMessages.length > 0) {
+              pendingMessages.length = 0;
+              addMessage('bot', 'Sorry, the connection was lost before I could reply. Please send your message again.');
+          }
+      });
+  }
+  
   function addMessage(role, content) {
       const messageElement = document.createElement('div');
       messageElement.classList.add('message');
@@ -103,6 +163,51 @@ document.addEventListener('DOMContentLoaded', function() {
       chatMessages.scrollTop = chatMessages.scrollHeight;
   }
   
+  function addStructuredMessage(data) {
+      const container = document.createElement('div');
+      
+      const title = document.createElement('p');
+      title.textContent = data.title;
+      container.appendChild(title);
+      
+      data.sections.forEach(section => {
+          if (section.heading) {
+              const heading = document.createElement('strong');
+              heading.textContent = section.heading;
+              container.appendChild(heading);
+          }
+          
+          // Numbered sections keep the server's numbering, which the user replies with
+          if (section.style === 'plain') {
+              section.items.forEach(item => {
+                  const line = document.createElement('div');
+                  line.textContent = item;
+                  container.appendChild(line);
+              });
+              return;
+          }
+          
+          const list = document.createElement(section.style === 'numbered' ? 'ol' : 'ul');
+          if (section.style === 'numbered') {
+              list.start = section.start;
+          }
+          section.items.forEach(item => {
+              const li = document.createElement('li');
+              li.textContent = item;
+              list.appendChild(li);
+          });
+          container.appendChild(list);
+      });
+      
+      if (data.footer) {
+          const footer = document.createElement('p');
+          footer.textContent = data.footer;
+          container.appendChild(footer);
+      }
+      
+      addMessage('bot', container.innerHTML);
+  }
+  
   function formatTime(date) {
       return date.toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
   }
@@ -0,0 +1,119 @@
+"""
+A stand-in for the Infermedica API, for generating cassettes without credentials.
+
+Responses are made up but shaped like the real ones, and every answer is a
+pure function of the request and SEED, so the same requests always produce the
+same cassettes. Each call also gets a latency drawn from a log-normal
+distribution (median LATENCY_MEDIAN_MS), which is what the cassette records.
+
+benchmark.py records its scenarios against this when there is no cassette
+directory yet, or when run with --generate-cassettes. Replays then use those
+recorded latencies, or a fresh sample per call with
+INFERMEDICA_REPLAY_LATENCY=lognormal:250:0.5.
+"""
+import hashlib
+import json
+import random
+
+from api_cassette import RecordedResponse
+
+SEED = 0
+LATENCY_MEDIAN_MS = 250
+LATENCY_SIGMA = 0.5
+
+# Follow-up questions stop once this much evidence has been collected
+QUESTIONS_UNTIL_EVIDENCE = 8
+
+_BASE_SYMPTOMS = [
+    "Fever", "Cough", "Headache", "Sore throat", "Runny nose", "Fatigue", "Nausea",
+    "Vomiting", "Diarrhea", "Abdominal pain", "Chest pain", "Shortness of breath",
+    "Dizziness", "Muscle pain", "Joint pain", "Back pain", "Rash", "Itching",
+    "Chills", "Sweating", "Loss of appetite", "Weight loss", "Insomnia", "Anxiety",
+    "Palpitations", "Swelling", "Ear pain", "Eye redness", "Sneezing", "Wheezing"
+]
+_MODIFIERS = ["Mild", "Severe", "Chronic", "Recurrent", "Sudden"]
+
+# The whole list is returned for every search, as /symptoms does; the client ranks it
+SYMPTOMS = [
+    {"id": f"s_{i}", "name": name, "common_name": name.lower()}
+    for i, name in enumerate(_BASE_SYMPTOMS + [f"{modifier} {base.lower()}" for modifier in _MODIFIERS for base in _BASE_SYMPTOMS])
+]
+
+CONDITIONS = [
+    "Common cold", "Influenza", "Acute bronchitis", "Migraine", "Tension-type headache",
+    "Gastroenteritis", "Sinusitis", "Pneumonia", "Allergic rhinitis", "COVID-19"
+]
+
+TRIAGE_LEVELS = ["self_care", "consultation", "consultation_24", "emergency"]
+
+_CHOICES = [
+    {"id": "present", "label": "Yes"},
+    {"id": "absent", "label": "No"},
+    {"id": "unknown", "label": "Don't know"}
+]
+
+
+def _rng(*parts):
+    return random.Random(hashlib.sha256(json.dumps([SEED, *parts], sort_keys=True).encode()).hexdigest())
+
+
+def _diagnosis(data):
+    evidence = data["evidence"]
+    rng = _rng("diagnosis", evidence)
+    present = sum(1 for item in evidence if item["choice_id"] == "present")
+
+    # More present evidence makes the top condition more certain
+    names = rng.sample(CONDITIONS, 4)
+    top = min(0.95, 0.25 + 0.08 * present + rng.uniform(0, 0.1))
+    rest = [rng.uniform(0.05, top) for _ in names[1:]]
+    conditions = [
+        {"id": f"c_{CONDITIONS.index(name)}", "name": name, "common_name": name, "probability": round(probability, 4)}
+        for name, probability in zip(names, [top] + sorted(rest, reverse=True))
+    ]
+
+    asked = {item["id"] for item in evidence}
+    candidates = [symptom for symptom in SYMPTOMS if symptom["id"] not in asked]
+    should_stop = len(evidence) >= QUESTIONS_UNTIL_EVIDENCE or not candidates
+
+    question = None
+    if not should_stop:
+        # Alternate between yes/no questions and "which of these" questions
+        if len(evidence) % 2 and len(candidates) >= 3:
+            items = rng.sample(candidates, 3)
+            question = {
+                "type": "group_single",
+                "text": "Which of these do you have?",
+                "items": [{"id": item["id"], "name": item["name"], "choices": _CHOICES} for item in items]
+            }
+        else:
+            item = rng.choice(candidates)
+            question = {
+                "type": "single",
+                "text": f"Do you have {item['common_name']}?",
+                "items": [{"id": item["id"], "name": item["name"], "choices": _CHOICES}]
+            }
+
+    return {"question": question, "conditions": conditions, "should_stop": should_stop}
+
+
+def _triage(data):
+    rng = _rng("triage", data["evidence"])
+    return {"triage_level": rng.choice(TRIAGE_LEVELS), "teleconsultation_applicable": rng.random() < 0.5}
+
+
+def respond(method, endpoint, params=None, body=None):
+    """
+    Answer one API call like Infermedica would.
+    Returns (response, latency in seconds).
+    """
+    if method == "GET" and endpoint == "symptoms":
+        result = SYMPTOMS
+    elif method == "POST" and endpoint == "diagnosis":
+        result = _diagnosis(body)
+    elif method == "POST" and endpoint == "triage":
+        result = _triage(body)
+    else:
+        return RecordedResponse({"status_code": 404, "body": "Not found"}), 0
+
+    latency = _rng("latency", method, endpoint, params, body).lognormvariate(0, LATENCY_SIGMA) * LATENCY_MEDIAN_MS / 1000
+    return RecordedResponse({"status_code": 200, "body": json.dumps(result)}), latency
@@ -0,0 +1,138 @@
+"""
+Concurrency-safe JSON persistence for per-user files.
+
+Several browser sessions (and processes) can be logged in as the same user,
+so every write goes through update_json: it takes a per-file lock, reads the
+current contents, lets the caller merge its changes in, and replaces the file
+atomically so a crash can never leave a half-written file behind.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+# Weak values, so a lock goes away once nobody holds or waits on it (bulk imports touch every file)
+_thread_locks = weakref.WeakValueDictionary()
+_thread_locks_guard = threading.Lock()
+
+
+def _thread_lock(path):
+    with _thread_locks_guard:
+        lock = _thread_locks.get(path)
+        if lock is None:
+            lock = _thread_locks[path] = threading.Lock()
+        return lock
+
+
+@contextmanager
+def file_lock(path):
+    """
+    Hold an exclusive lock for path, across threads and (where fcntl exists) processes.
+    The lock lives in a separate '<path>.lock' file so the data file can be replaced.
+    """
+    path = os.path.abspath(path)
+    with _thread_lock(path):
+        if fcntl is None:
+            yield
+            return
+
+        with open(path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_json(path, default=None):
+    """
+    Read a JSON file, returning default if it doesn't exist.
+    """
+    try:
+        with open(path, 'r') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return default
+
+
+def atomic_write_json(path, data):
+    """
+    Write data to path through a temp file and rename, so readers only ever
+    see the old or the new contents.
+    """
+    atomic_write_text(path, json.dumps(data, indent=4))
+
+
+def atomic_write_text(path, text):
+    """
+    Same as atomic_write_json, for contents that are already serialized.
+    """
+    directory = os.path.dirname(path) or "."
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".json")
+    try:
+        with os.fdopen(fd, 'w') as file:
+            file.write(text)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def update_json(path, update, default=None):
+    """
+    Locked read-modify-write of a JSON file.
+    update receives the current contents (or default) and returns what to save.
+    A file that can't be parsed is moved aside to '<path>.corrupt-<time>' and
+    treated as missing, so one bad file doesn't block every later save.
+    Returns the saved value.
+    """
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+
+    with file_lock(path):
+        try:
+            current = read_json(path, default)
+        except ValueError as e:  # JSONDecodeError or UnicodeDecodeError, e.g. half-written by a crash
+            corrupt_path = f"{path}.corrupt-{time.strftime('%Y%m%d-%H%M%S')}"
+            os.replace(path, corrupt_path)
+            print(f"Moved unreadable {path} to {corrupt_path}: {e}")
+            current = default
+        new_data = update(current)
+        atomic_write_json(path, new_data)
+        return new_data
+
+
+def merge_list(base, ours, theirs):
+    """
+    Three-way merge of a list field: keep what is on disk (theirs), drop the
+    items this session removed since base, and add the items it added.
+    """
+    removed = [item for item in base if item not in ours]
+    added = [item for item in ours if item not in base]
+
+    merged = [item for item in theirs if item not in removed]
+    merged.extend(item for item in added if item not in merged)
+    return merged
+
+
+def delete_file(path):
+    """
+    Delete a file under its lock. Returns False if it didn't exist.
+    """
+    with file_lock(path):
+        if not os.path.exists(path):
+            return False
+        os.remove(path)
+        return True